@@ -2,11 +2,22 @@
 LearnLens — Adaptive AI Micro-Tutor
 FastAPI Backend Entry Point
 """
+import logging
+from logging.handlers import RotatingFileHandler
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from models.database import init_db
+from models.database import init_db, SessionLocal
+from services.embedding import warm_embedding_model, embed_missing_chunks
+from services.llm_service import warm_model
 from routers import documents, quizzes, progress
 
+# Application logs go to a size-capped rotating file (1MB x 3 backups)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    handlers=[RotatingFileHandler("app.log", maxBytes=1 << 20, backupCount=3)],
+)
+
 app = FastAPI(
     title="LearnLens API",
     description="Adaptive AI Micro-Tutor — Transform lecture PDFs into personalized quizzes with Socratic hints",
@@ -28,12 +39,34 @@ app.include_router(quizzes.router)
 app.include_router(progress.router)
 
 
+logger = logging.getLogger(__name__)
+
+
+def _embed_missing_chunks() -> None:
+    """One-time backfill of vectors for chunks stored before sqlite-vec."""
+    db = SessionLocal()
+    try:
+        count = embed_missing_chunks(db)
+        if count:
+            print(f"🔁 Re-embedded {count} chunks")
+    except Exception:
+        logger.exception("Re-embedding stored chunks failed; vector search may miss older documents")
+    finally:
+        db.close()
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup."""
+    """Initialize database and warm the embedding and LLM models on startup."""
     init_db()
+    embedding_ready = warm_embedding_model()
+    llm_ready = warm_model()
+    if embedding_ready:
+        _embed_missing_chunks()
     print("✨ LearnLens API started successfully!")
     print("📚 Database initialized")
+    print("🧠 Embedding model loaded" if embedding_ready else "⚠️  Embedding model unavailable — it will load on first upload")
+    print("🤖 LLM loaded" if llm_ready else "⚠️  Ollama unreachable — LLM will load on first request")
     print("🔗 API docs available at /docs")
 
 
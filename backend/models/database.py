@@ -1,14 +1,47 @@
 """
 Database models for LearnLens — SQLAlchemy + SQLite
 """
+import logging
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, Boolean, JSON, ForeignKey
+import sqlite_vec
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, Float, Text, DateTime, Boolean, JSON, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = "sqlite:///./learnlens.db"
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2 output size
+
+# One pooled connection per concurrent request; under WAL readers never block
+# on the writer, and the busy timeout makes competing writers wait instead of
+# failing with "database is locked".
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": 30},
+    poolclass=QueuePool,
+    pool_size=10,
+    max_overflow=20,
+    query_cache_size=1200,  # compiled-SQL cache shared by all connections (default 500)
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Enable WAL, a larger page cache, and the sqlite-vec extension on every new SQLite connection."""
+    dbapi_connection.enable_load_extension(True)
+    sqlite_vec.load(dbapi_connection)
+    dbapi_connection.enable_load_extension(False)
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-64000")  # ~64MB
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256MB
+    cursor.close()
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -40,25 +73,31 @@ class Chunk(Base):
     __tablename__ = "chunks"
 
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
     text = Column(Text, nullable=False)
     page_num = Column(Integer)
     chunk_index = Column(Integer)
     topic = Column(String, nullable=True)
+    content_hash = Column(String(32), nullable=True, index=True)  # blake2b of normalized text
 
     document = relationship("Document", back_populates="chunks")
 
+    __table_args__ = (
+        Index("ix_chunk_doc_topic", "document_id", "topic"),
+    )
+
 
 class Quiz(Base):
     __tablename__ = "quizzes"
 
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
     topic = Column(String, nullable=True)
     difficulty = Column(String, default="medium")  # easy | medium | hard
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     completed = Column(Boolean, default=False)
     score = Column(Float, nullable=True)
+    content_hash = Column(String(32), nullable=True, index=True)  # QuizCache key it was generated for
 
     document = relationship("Document", back_populates="quizzes")
     questions = relationship("Question", back_populates="quiz", cascade="all, delete-orphan")
@@ -68,11 +107,12 @@ class Question(Base):
     __tablename__ = "questions"
 
     id = Column(Integer, primary_key=True, index=True)
-    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False, index=True)
     question_type = Column(String, default="mcq")  # mcq | short_answer
     question_text = Column(Text, nullable=False)
     options = Column(JSON, nullable=True)  # list of strings for MCQ
     correct_answer = Column(Text, nullable=False)
+    correct_letter = Column(String(1), nullable=True)  # resolved MCQ option letter (A, B, ...)
     explanation = Column(Text, nullable=True)
     hint_1 = Column(Text, nullable=True)
     hint_2 = Column(Text, nullable=True)
@@ -80,14 +120,14 @@ class Question(Base):
     source_chunk = Column(Text, nullable=True)  # context this was derived from
 
     quiz = relationship("Quiz", back_populates="questions")
-    progress = relationship("QuestionProgress", back_populates="question", cascade="all, delete-orphan")
+    progress = relationship("QuestionProgress", back_populates="question", uselist=False, cascade="all, delete-orphan")
 
 
 class QuestionProgress(Base):
     __tablename__ = "question_progress"
 
     id = Column(Integer, primary_key=True, index=True)
-    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False, unique=True, index=True)
     attempts = Column(Integer, default=0)
     correct = Column(Boolean, default=False)
     hints_used = Column(Integer, default=0)
@@ -100,6 +140,10 @@ class QuestionProgress(Base):
 
     question = relationship("Question", back_populates="progress")
 
+    __table_args__ = (
+        Index("ix_qp_review", "next_review", "answered_at"),
+    )
+
 
 class UserStats(Base):
     __tablename__ = "user_stats"
@@ -115,9 +159,52 @@ class UserStats(Base):
     total_quizzes_completed = Column(Integer, default=0)
 
 
+class QuizCache(Base):
+    """Generated questions keyed by source content, reused when the same content is uploaded again."""
+    __tablename__ = "quiz_cache"
+
+    content_hash = Column(String(32), primary_key=True)  # chunk hashes + quiz settings
+    questions = Column(JSON, nullable=False)  # question dicts as returned by generate_quiz
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+def _upgrade_schema(conn) -> None:
+    """
+    Add columns and indexes that databases created by older versions lack;
+    create_all only creates missing tables. New columns are all nullable.
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info("Added column %s.%s", table.name, column.name)
+        for index in table.indexes:
+            try:
+                with conn.begin_nested():
+                    index.create(conn, checkfirst=True)
+            except Exception as e:
+                # e.g. a unique index over rows that already hold duplicates
+                logger.warning("Could not create index %s: %s", index.name, e)
+
+
 # Create all tables
 def init_db():
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        _upgrade_schema(conn)
+    # Chunk embeddings live in a sqlite-vec table keyed by chunks.id and
+    # partitioned by document so KNN search only scans one document.
+    # Vectors are stored L2-normalized, so plain L2 distance ranks exactly
+    # like cosine without recomputing norms on every comparison.
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunk_vec USING vec0("
+            "document_id integer partition key, "
+            f"embedding float[{EMBEDDING_DIM}] distance_metric=l2)"
+        ))
     # Ensure a default UserStats row exists
     db = SessionLocal()
     try:
@@ -1,16 +1,25 @@
 """
 Documents router — upload, list, and inspect PDF documents
 """
-import traceback
+import asyncio
+import logging
+import os
+import tempfile
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from models.database import get_db, Document, Chunk
+from models.database import get_db, Document, Chunk, Quiz
 from services.pdf_service import parse_pdf, chunk_text
-from services.embedding import embed_chunks
+from services.embedding import embed_chunks, store_chunk_embeddings, delete_document_embeddings
 from services.llm_service import extract_topics
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
+UPLOAD_READ_SIZE = 1 << 20  # stream uploads to disk in 1MB pieces
+
 
 @router.post("/upload")
 async def upload_document(file: UploadFile = File(...), db: Session = Depends(get_db)):
@@ -18,8 +27,14 @@ async def upload_document(file: UploadFile = File(...), db: Session = Depends(ge
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
 
+    doc = None
+    upload_path = None
     try:
-        file_bytes = await file.read()
+        # Stream the upload to a temp file so peak memory doesn't grow with the PDF size
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            upload_path = tmp.name
+            while piece := await file.read(UPLOAD_READ_SIZE):
+                tmp.write(piece)
 
         # Create document record
         doc = Document(
@@ -30,8 +45,8 @@ async def upload_document(file: UploadFile = File(...), db: Session = Depends(ge
         db.commit()
         db.refresh(doc)
 
-        # Parse PDF
-        pages = parse_pdf(file_bytes)
+        # Parse PDF (CPU-bound work runs in the threadpool to keep the event loop free)
+        pages = await run_in_threadpool(parse_pdf, upload_path)
         if not pages:
             doc.status = "error"
             db.commit()
@@ -40,31 +55,35 @@ async def upload_document(file: UploadFile = File(...), db: Session = Depends(ge
         doc.num_pages = len(pages)
 
         # Chunk the text
-        chunks = chunk_text(pages)
+        chunks = await run_in_threadpool(lambda: list(chunk_text(pages)))
         doc.num_chunks = len(chunks)
 
-        # Save chunks to DB
-        for chunk_data in chunks:
-            chunk = Chunk(
+        # Embed chunks and extract topics using LLM concurrently
+        full_text = " ".join([c["text"] for c in chunks[:5]])  # Use first 5 chunks
+        embeddings, topics = await asyncio.gather(
+            run_in_threadpool(embed_chunks, chunks),
+            run_in_threadpool(extract_topics, full_text),
+        )
+        doc.topics = topics
+
+        # Save chunks to DB in a single batch, assigning topics
+        # round-robin up front so no update pass is needed
+        db_chunks = [
+            Chunk(
                 document_id=doc.id,
                 text=chunk_data["text"],
                 page_num=chunk_data["page_num"],
                 chunk_index=chunk_data["chunk_index"],
+                topic=topics[chunk_data["chunk_index"] % len(topics)] if topics else "General",
+                content_hash=chunk_data["content_hash"],
             )
-            db.add(chunk)
+            for chunk_data in chunks
+        ]
+        db.add_all(db_chunks)
+        db.flush()  # assigns chunk ids, which key the vector rows
 
-        # Embed chunks into ChromaDB
-        embed_chunks(chunks, doc.id)
-
-        # Extract topics using LLM
-        full_text = " ".join([c["text"] for c in chunks[:5]])  # Use first 5 chunks
-        topics = extract_topics(full_text)
-        doc.topics = topics
-
-        # Assign topics to chunks (simple round-robin for now)
-        db_chunks = db.query(Chunk).filter(Chunk.document_id == doc.id).all()
-        for i, chunk in enumerate(db_chunks):
-            chunk.topic = topics[i % len(topics)] if topics else "General"
+        # Store embeddings in the sqlite-vec table, in the same transaction
+        store_chunk_embeddings(db, doc.id, [c.id for c in db_chunks], embeddings)
 
         doc.status = "ready"
         db.commit()
@@ -82,17 +101,29 @@ async def upload_document(file: UploadFile = File(...), db: Session = Depends(ge
     except HTTPException:
         raise
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("upload failed for %s", file.filename)
         if doc and doc.id:
             doc.status = "error"
             db.commit()
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
+    finally:
+        if upload_path:
+            os.unlink(upload_path)
 
 
 @router.get("/")
 async def list_documents(db: Session = Depends(get_db)):
     """List all uploaded documents."""
-    docs = db.query(Document).order_by(Document.upload_date.desc()).all()
+    # Project just the listed columns; rows skip ORM identity-map bookkeeping
+    docs = db.query(
+        Document.id,
+        Document.filename,
+        Document.upload_date,
+        Document.num_pages,
+        Document.num_chunks,
+        Document.topics,
+        Document.status,
+    ).order_by(Document.upload_date.desc()).all()
     return [
         {
             "id": doc.id,
@@ -122,7 +153,7 @@ async def get_document(document_id: int, db: Session = Depends(get_db)):
         "num_chunks": doc.num_chunks,
         "topics": doc.topics or [],
         "status": doc.status,
-        "quizzes_count": len(doc.quizzes),
+        "quizzes_count": db.query(func.count(Quiz.id)).filter(Quiz.document_id == document_id).scalar(),
     }
 
 
@@ -134,14 +165,8 @@ async def delete_document(document_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Document not found")
 
     db.delete(doc)
+    # Also clean up stored chunk embeddings
+    delete_document_embeddings(db, document_id)
     db.commit()
 
-    # Also clean up ChromaDB collection
-    from services.embedding import get_chroma_client
-    try:
-        client = get_chroma_client()
-        client.delete_collection(f"doc_{document_id}")
-    except Exception:
-        pass
-
     return {"message": "Document deleted successfully"}
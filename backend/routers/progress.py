@@ -4,12 +4,27 @@ Progress router — dashboard stats, mastery, review queue
 from datetime import datetime
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, case, and_, select, bindparam
 from models.database import get_db, UserStats, Quiz, Question, QuestionProgress, Document
 from services.quiz_engine import get_level
 
 router = APIRouter(prefix="/api/progress", tags=["progress"])
 
+# Review-queue statement built once at import so its compiled SQL is reused;
+# joins in the question columns so the queue is a single round-trip
+_REVIEW_QUEUE = select(
+    Question.id,
+    Question.question_text,
+    Question.question_type,
+    QuestionProgress.answered_at,
+    QuestionProgress.attempts,
+).join(
+    QuestionProgress, QuestionProgress.question_id == Question.id
+).where(
+    QuestionProgress.next_review <= bindparam("now"),
+    QuestionProgress.answered_at.isnot(None)
+).limit(20)
+
 
 @router.get("/stats")
 async def get_stats(db: Session = Depends(get_db)):
@@ -54,22 +69,26 @@ async def get_dashboard(db: Session = Depends(get_db)):
             if topic not in topics:
                 topics[topic] = {"total": 0, "correct": 0, "document": doc.filename}
 
-    # Get question-level progress per topic
-    quizzes = db.query(Quiz).all()
-    for quiz in quizzes:
-        topic = quiz.topic or "General"
+    # Get question-level progress per topic in a single grouped query
+    topic_col = func.coalesce(Quiz.topic, "General")
+    topic_rows = db.query(
+        topic_col,
+        func.count(QuestionProgress.id),
+        func.sum(case((QuestionProgress.correct, 1), else_=0)),
+    ).outerjoin(
+        Question, Question.quiz_id == Quiz.id
+    ).outerjoin(
+        QuestionProgress, and_(
+            QuestionProgress.question_id == Question.id,
+            QuestionProgress.answered_at.isnot(None)
+        )
+    ).group_by(topic_col).all()
+
+    for topic, answered, correct in topic_rows:
         if topic not in topics:
             topics[topic] = {"total": 0, "correct": 0, "document": ""}
-
-        for question in quiz.questions:
-            progress = db.query(QuestionProgress).filter(
-                QuestionProgress.question_id == question.id,
-                QuestionProgress.answered_at.isnot(None)
-            ).first()
-            if progress:
-                topics[topic]["total"] += 1
-                if progress.correct:
-                    topics[topic]["correct"] += 1
+        topics[topic]["total"] += answered or 0
+        topics[topic]["correct"] += correct or 0
 
     topic_mastery = []
     for name, data in topics.items():
@@ -84,20 +103,29 @@ async def get_dashboard(db: Session = Depends(get_db)):
 
     # Recent quizzes
     recent_quizzes = db.query(Quiz).order_by(Quiz.created_at.desc()).limit(10).all()
+
+    # Question/answered/correct counts for all recent quizzes in one aggregate query
+    recent_ids = [quiz.id for quiz in recent_quizzes]
+    quiz_progress = {}
+    if recent_ids:
+        rows = db.query(
+            Question.quiz_id,
+            func.count(Question.id).label("total"),
+            func.count(QuestionProgress.id).label("answered"),
+            func.sum(case((QuestionProgress.correct, 1), else_=0)).label("correct"),
+        ).outerjoin(
+            QuestionProgress, and_(
+                QuestionProgress.question_id == Question.id,
+                QuestionProgress.answered_at.isnot(None)
+            )
+        ).filter(
+            Question.quiz_id.in_(recent_ids)
+        ).group_by(Question.quiz_id).all()
+        quiz_progress = {row.quiz_id: (row.total, row.answered, row.correct or 0) for row in rows}
+
     recent = []
     for quiz in recent_quizzes:
-        total_q = len(quiz.questions)
-        answered = 0
-        correct = 0
-        for q in quiz.questions:
-            prog = db.query(QuestionProgress).filter(
-                QuestionProgress.question_id == q.id,
-                QuestionProgress.answered_at.isnot(None)
-            ).first()
-            if prog:
-                answered += 1
-                if prog.correct:
-                    correct += 1
+        total_q, answered, correct = quiz_progress.get(quiz.id, (0, 0, 0))
 
         recent.append({
             "quiz_id": quiz.id,
@@ -112,22 +140,18 @@ async def get_dashboard(db: Session = Depends(get_db)):
         })
 
     # Items due for review (spaced repetition)
-    review_items = db.query(QuestionProgress).filter(
-        QuestionProgress.next_review <= datetime.utcnow(),
-        QuestionProgress.answered_at.isnot(None)
-    ).limit(20).all()
-
-    review_queue = []
-    for item in review_items:
-        question = db.query(Question).filter(Question.id == item.question_id).first()
-        if question:
-            review_queue.append({
-                "question_id": question.id,
-                "question_text": question.question_text,
-                "question_type": question.question_type,
-                "last_attempt": item.answered_at.isoformat() if item.answered_at else None,
-                "attempts": item.attempts,
-            })
+    review_items = db.execute(_REVIEW_QUEUE, {"now": datetime.utcnow()}).all()
+
+    review_queue = [
+        {
+            "question_id": item.id,
+            "question_text": item.question_text,
+            "question_type": item.question_type,
+            "last_attempt": item.answered_at.isoformat() if item.answered_at else None,
+            "attempts": item.attempts,
+        }
+        for item in review_items
+    ]
 
     return {
         "stats": {
@@ -1,18 +1,34 @@
 """
 Quizzes router — generate quizzes, answer questions, get hints
 """
+import hashlib
+import json
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select, bindparam, exists
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import Optional
-from models.database import get_db, Document, Chunk, Quiz, Question, QuestionProgress, UserStats
-from services.llm_service import generate_quiz, generate_hint, evaluate_answer
+from models.database import get_db, Document, Chunk, Quiz, Question, QuestionProgress, QuizCache, UserStats
+from services.llm_service import generate_quiz, generate_hint, stream_hint, evaluate_answer, is_fallback_quiz
+from services.pdf_service import content_hash
 from services.embedding import find_relevant_chunks
 from services.quiz_engine import calculate_sm2, calculate_xp, update_streak, get_adaptive_difficulty
 
 router = APIRouter(prefix="/api/quizzes", tags=["quizzes"])
 
+# Hot-path statement built once at import; the engine's compiled cache reuses
+# its SQL string on every /answer and /hint request
+_QUESTION_WITH_PROGRESS = select(Question).options(
+    joinedload(Question.progress)
+).where(Question.id == bindparam("question_id"))
+
+
+def _quiz_cache_key(chunk_hashes: list, num_questions: int, difficulty: str) -> str:
+    key = "|".join(chunk_hashes + [str(num_questions), difficulty])
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
 
 class GenerateQuizRequest(BaseModel):
     document_id: int
@@ -31,6 +47,33 @@ class HintRequest(BaseModel):
     hint_level: int  # 1, 2, or 3
 
 
+def _resolve_correct_letter(correct_answer: str, options: Optional[list]) -> Optional[str]:
+    """Find the option letter (A=0, B=1, etc.) matching an MCQ's correct answer."""
+    if not options:
+        return None
+    answer = correct_answer.strip().lower()
+    # LLM sometimes answers with the bare letter
+    if len(answer) == 1 and 0 <= ord(answer) - ord("a") < len(options):
+        return answer.upper()
+    for i, opt in enumerate(options):
+        if answer in opt.lower():
+            return chr(65 + i)
+    return None
+
+
+def _submitted_letter(user_answer: str, options: Optional[list]) -> Optional[str]:
+    """Option letter of a submitted MCQ answer: the chosen option's position, a bare letter, or an "X)"/"X." prefix."""
+    answer = user_answer.lower()
+    for i, opt in enumerate(options or []):
+        if answer == opt.strip().lower():
+            return chr(65 + i)
+    if len(answer) == 1 and answer.isalpha():
+        return answer.upper()
+    if len(answer) >= 2 and answer[0].isalpha() and answer[1] in ").":
+        return answer[0].upper()
+    return None
+
+
 @router.post("/generate")
 async def generate_quiz_endpoint(req: GenerateQuizRequest, db: Session = Depends(get_db)):
     """Generate a new quiz from a document, optionally filtered by topic."""
@@ -47,70 +90,90 @@ async def generate_quiz_endpoint(req: GenerateQuizRequest, db: Session = Depends
 
     # Get relevant chunks
     if req.topic:
-        # Topic-specific: retrieve chunks matching topic
-        chunks = db.query(Chunk).filter(
+        # Topic-specific: retrieve chunks matching topic. The limited query
+        # doubles as the existence check, so exact topic matches never pay
+        # for a query embedding or vector search
+        selected = db.query(Chunk.text, Chunk.content_hash).filter(
             Chunk.document_id == req.document_id,
             Chunk.topic == req.topic
-        ).all()
-        if not chunks:
+        ).order_by(Chunk.chunk_index).limit(5).all()
+        if not selected:
             # Fallback: use embedding search
-            search_chunks = find_relevant_chunks(req.topic, req.document_id, top_k=5)
-            context = "\n\n".join([c["text"] for c in search_chunks])
-        else:
-            context = "\n\n".join([c.text for c in chunks[:5]])
+            search_chunks = find_relevant_chunks(db, req.topic, req.document_id, top_k=5)
+            selected = [(c["text"], None) for c in search_chunks]
     else:
         # General: use a sample of chunks across the document
-        chunks = db.query(Chunk).filter(Chunk.document_id == req.document_id).all()
+        chunks = db.query(Chunk.text, Chunk.content_hash).filter(Chunk.document_id == req.document_id).all()
         # Use every Nth chunk to get coverage
         step = max(1, len(chunks) // 5)
         selected = chunks[::step][:5]
-        context = "\n\n".join([c.text for c in selected])
+    context = "\n\n".join([text for text, _ in selected])
 
     if not context.strip():
         raise HTTPException(status_code=400, detail="No content available for quiz generation")
 
-    # Generate quiz via LLM
-    questions_data = generate_quiz(context, req.num_questions, difficulty)
+    # Reuse questions generated for identical content (e.g. the same PDF
+    # uploaded again), but only for the first such quiz in this document so
+    # retakes still get fresh questions
+    cache_key = _quiz_cache_key(
+        [chunk_hash or content_hash(text) for text, chunk_hash in selected],
+        req.num_questions,
+        difficulty,
+    )
+    cached = db.get(QuizCache, cache_key)
+    if cached and not db.query(exists().where(
+        Quiz.document_id == req.document_id,
+        Quiz.content_hash == cache_key,
+    )).scalar():
+        questions_data = cached.questions
+    else:
+        # Generate quiz via LLM
+        questions_data = generate_quiz(context, req.num_questions, difficulty)
+        if not is_fallback_quiz(questions_data):
+            db.merge(QuizCache(content_hash=cache_key, questions=questions_data))
 
     # Create quiz in DB
     quiz = Quiz(
         document_id=req.document_id,
         topic=req.topic,
         difficulty=difficulty,
+        content_hash=cache_key,
     )
     db.add(quiz)
-    db.commit()
-    db.refresh(quiz)
+    db.flush()
 
-    # Create questions
-    created_questions = []
-    for q_data in questions_data:
-        question = Question(
+    # Create questions in one batch; flush assigns their primary keys
+    questions = [
+        Question(
             quiz_id=quiz.id,
             question_type=q_data.get("question_type", "mcq"),
             question_text=q_data.get("question_text", ""),
             options=q_data.get("options"),
             correct_answer=q_data.get("correct_answer", ""),
+            correct_letter=_resolve_correct_letter(q_data.get("correct_answer", ""), q_data.get("options")),
             explanation=q_data.get("explanation", ""),
             hint_1=q_data.get("hint_1", "Think about the key concepts..."),
             hint_2=q_data.get("hint_2", "Consider the relationships between ideas..."),
             hint_3=q_data.get("hint_3", "Focus on the specific details mentioned..."),
             source_chunk=context[:500],
         )
-        db.add(question)
-        db.commit()
-        db.refresh(question)
+        for q_data in questions_data
+    ]
+    db.add_all(questions)
+    db.flush()
 
-        # Create progress entry
-        progress = QuestionProgress(question_id=question.id)
-        db.add(progress)
+    # Create progress entries
+    db.add_all([QuestionProgress(question_id=question.id) for question in questions])
 
-        created_questions.append({
+    created_questions = [
+        {
             "id": question.id,
             "question_type": question.question_type,
             "question_text": question.question_text,
             "options": question.options,
-        })
+        }
+        for question in questions
+    ]
 
     db.commit()
 
@@ -127,29 +190,21 @@ async def generate_quiz_endpoint(req: GenerateQuizRequest, db: Session = Depends
 @router.post("/answer")
 async def answer_question(req: AnswerRequest, db: Session = Depends(get_db)):
     """Submit an answer to a question and get feedback + XP."""
-    question = db.query(Question).filter(Question.id == req.question_id).first()
+    question = db.scalars(_QUESTION_WITH_PROGRESS, {"question_id": req.question_id}).first()
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
 
-    progress = db.query(QuestionProgress).filter(
-        QuestionProgress.question_id == req.question_id
-    ).first()
+    progress = question.progress
 
     # Evaluate answer
     if question.question_type == "mcq":
-        # For MCQ, do simple comparison
-        is_correct = req.user_answer.strip().lower() == question.correct_answer.strip().lower()
-        # Also check if answer starts with correct option letter
-        if not is_correct and question.options:
-            correct_idx = None
-            for i, opt in enumerate(question.options):
-                if question.correct_answer.strip().lower() in opt.lower():
-                    correct_idx = i
-                    break
-            if correct_idx is not None:
-                user_letter = req.user_answer.strip().upper()
-                if user_letter == chr(65 + correct_idx):  # A=0, B=1, etc.
-                    is_correct = True
+        # For MCQ, compare the option letter resolved at generation time
+        user_answer = req.user_answer.strip()
+        is_correct = question.correct_letter is not None and \
+            _submitted_letter(user_answer, question.options) == question.correct_letter
+        # Fall back to full-string match
+        if not is_correct:
+            is_correct = user_answer.lower() == question.correct_answer.strip().lower()
 
         eval_result = {
             "is_correct": is_correct,
@@ -217,24 +272,38 @@ async def answer_question(req: AnswerRequest, db: Session = Depends(get_db)):
     }
 
 
-@router.post("/hint")
-async def get_hint(req: HintRequest, db: Session = Depends(get_db)):
-    """Get a Socratic hint for a question (level 1-3)."""
-    question = db.query(Question).filter(Question.id == req.question_id).first()
+def _hint_question(req: HintRequest, db: Session) -> Question:
+    question = db.scalars(_QUESTION_WITH_PROGRESS, {"question_id": req.question_id}).first()
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
 
     if req.hint_level < 1 or req.hint_level > 3:
         raise HTTPException(status_code=400, detail="Hint level must be 1, 2, or 3")
+    return question
 
-    # Check if pre-generated hints exist
-    pre_generated = {
+
+def _pre_generated_hint(question: Question, hint_level: int) -> Optional[str]:
+    return {
         1: question.hint_1,
         2: question.hint_2,
         3: question.hint_3,
-    }
+    }.get(hint_level)
 
-    hint_text = pre_generated.get(req.hint_level)
+
+def _record_hint_used(question: Question, hint_level: int, db: Session) -> None:
+    progress = question.progress
+    if progress:
+        progress.hints_used = max(progress.hints_used, hint_level)
+        db.commit()
+
+
+@router.post("/hint")
+async def get_hint(req: HintRequest, db: Session = Depends(get_db)):
+    """Get a Socratic hint for a question (level 1-3)."""
+    question = _hint_question(req, db)
+
+    # Check if pre-generated hints exist
+    hint_text = _pre_generated_hint(question, req.hint_level)
 
     # If no pre-generated hint, generate one dynamically
     if not hint_text:
@@ -246,12 +315,7 @@ async def get_hint(req: HintRequest, db: Session = Depends(get_db)):
         )
 
     # Update progress
-    progress = db.query(QuestionProgress).filter(
-        QuestionProgress.question_id == req.question_id
-    ).first()
-    if progress:
-        progress.hints_used = max(progress.hints_used, req.hint_level)
-        db.commit()
+    _record_hint_used(question, req.hint_level, db)
 
     return {
         "question_id": req.question_id,
@@ -261,19 +325,49 @@ async def get_hint(req: HintRequest, db: Session = Depends(get_db)):
     }
 
 
+@router.post("/hint/stream")
+async def stream_hint_endpoint(req: HintRequest, db: Session = Depends(get_db)):
+    """
+    Same as /hint, streamed as Server-Sent Events: "data" events carry
+    {"text": ...} pieces of the hint, then a final "done" event carries
+    the hint metadata.
+    """
+    question = _hint_question(req, db)
+    hint_text = _pre_generated_hint(question, req.hint_level)
+    question_text, correct_answer = question.question_text, question.correct_answer
+    source_chunk = question.source_chunk or ""
+
+    # Progress is recorded up front: the session is not used once streaming starts
+    _record_hint_used(question, req.hint_level, db)
+
+    def events():
+        pieces = [hint_text] if hint_text else stream_hint(
+            question_text, correct_answer, req.hint_level, source_chunk
+        )
+        for piece in pieces:
+            yield f"data: {json.dumps({'text': piece})}\n\n"
+        done = {
+            "question_id": req.question_id,
+            "hint_level": req.hint_level,
+            "hints_remaining": 3 - req.hint_level,
+        }
+        yield f"event: done\ndata: {json.dumps(done)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 @router.get("/{quiz_id}")
 async def get_quiz(quiz_id: int, db: Session = Depends(get_db)):
     """Get quiz details with all questions."""
-    quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+    quiz = db.query(Quiz).options(
+        selectinload(Quiz.questions).joinedload(Question.progress)
+    ).filter(Quiz.id == quiz_id).first()
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
 
     questions = []
     for q in quiz.questions:
-        progress = db.query(QuestionProgress).filter(
-            QuestionProgress.question_id == q.id
-        ).first()
-
+        progress = q.progress
         questions.append({
             "id": q.id,
             "question_type": q.question_type,
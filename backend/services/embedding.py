@@ -1,91 +1,224 @@
 """
-Embedding service using sentence-transformers + ChromaDB for LearnLens
+Embedding service using INT8-quantized MiniLM (ONNX Runtime) + sqlite-vec for LearnLens
 """
-import chromadb
-from sentence_transformers import SentenceTransformer
+import logging
+import os
+import threading
+from functools import lru_cache
+import numpy as np
+import onnxruntime
+from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from transformers import AutoTokenizer
 from typing import List
 
-# Initialize model globally (loaded once)
-_model = None
-_chroma_client = None
+logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+QUANTIZED_MODEL_DIR = "./onnx_models/all-MiniLM-L6-v2-int8"
+MAX_SEQ_LENGTH = 256  # same truncation sentence-transformers uses for MiniLM
+EMBED_BATCH_SIZE = 128  # larger batches keep the matmul kernels saturated during ingest
+# Written by _export_quantized_model; the tokenizer is saved last
+_QUANTIZED_MODEL_FILES = ("model_quantized.onnx", "tokenizer_config.json", "tokenizer.json")
 
-def get_embedding_model() -> SentenceTransformer:
-    global _model
-    if _model is None:
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
+# Initialize model globally (loaded once)
+_model = None
+_tokenizer = None
+_load_lock = threading.Lock()
+# The fast tokenizer reconfigures padding/truncation per call and raises
+# "Already borrowed" when two threads use it at once (uploads run embedding
+# and topic extraction concurrently), so every call goes through this lock
+_tokenizer_lock = threading.Lock()
+
+
+def _export_quantized_model() -> None:
+    """Export MiniLM to ONNX and apply INT8 dynamic quantization (one-time, cached on disk)."""
+    model = ORTModelForFeatureExtraction.from_pretrained(
+        EMBEDDING_MODEL_ID, export=True, provider="CPUExecutionProvider"
+    )
+    quantizer = ORTQuantizer.from_pretrained(model)
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=QUANTIZED_MODEL_DIR, quantization_config=qconfig)
+    AutoTokenizer.from_pretrained(EMBEDDING_MODEL_ID).save_pretrained(QUANTIZED_MODEL_DIR)
+
+
+def _quantized_model_ready() -> bool:
+    """True once every export artifact exists, so an interrupted export is redone."""
+    return all(os.path.isfile(os.path.join(QUANTIZED_MODEL_DIR, name)) for name in _QUANTIZED_MODEL_FILES)
+
+
+def _execution_provider() -> str:
+    """Prefer the CUDA provider when onnxruntime-gpu is installed and a GPU is present."""
+    if "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+        return "CUDAExecutionProvider"
+    return "CPUExecutionProvider"
+
+
+def get_embedding_model() -> ORTModelForFeatureExtraction:
+    global _model, _tokenizer
+    with _load_lock:
+        if _model is None:
+            if not _quantized_model_ready():
+                _export_quantized_model()
+            _tokenizer = AutoTokenizer.from_pretrained(QUANTIZED_MODEL_DIR)
+            _model = ORTModelForFeatureExtraction.from_pretrained(
+                QUANTIZED_MODEL_DIR,
+                file_name="model_quantized.onnx",
+                provider=_execution_provider(),
+            )
     return _model
 
 
-def get_chroma_client() -> chromadb.Client:
-    global _chroma_client
-    if _chroma_client is None:
-        _chroma_client = chromadb.PersistentClient(path="./chroma_db")
-    return _chroma_client
+def fits_embedding_window(text: str) -> bool:
+    """True if text is short enough to embed whole, i.e. embed() won't truncate it."""
+    # Every word is at least one token, plus [CLS] and [SEP]
+    if len(text.split()) + 2 > MAX_SEQ_LENGTH:
+        return False
+    get_embedding_model()
+    with _tokenizer_lock:
+        return len(_tokenizer(text, truncation=False)["input_ids"]) <= MAX_SEQ_LENGTH
 
 
-def embed_chunks(chunks: List[dict], document_id: int) -> None:
+def embed(texts: List[str], batch_size: int = 32) -> np.ndarray:
     """
-    Embed document chunks and store in ChromaDB.
-    Collection name = doc_{document_id}
+    Encode texts into L2-normalized sentence embeddings.
+    Mean-pools token embeddings over the attention mask, like sentence-transformers.
     """
     model = get_embedding_model()
-    client = get_chroma_client()
-
-    collection_name = f"doc_{document_id}"
-
-    # Delete existing collection if re-embedding
+    batches = []
+    for start in range(0, len(texts), batch_size):
+        with _tokenizer_lock:
+            inputs = _tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=MAX_SEQ_LENGTH,
+                return_tensors="np",
+            )
+        token_embeddings = model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        batches.append(pooled.astype(np.float32))
+
+    if not batches:
+        return np.zeros((0, model.config.hidden_size), dtype=np.float32)
+    return np.concatenate(batches)
+
+
+@lru_cache(maxsize=1024)
+def _embed_query(query: str) -> tuple:
+    """Embed a single query string; repeated topic queries are served from the cache."""
+    return tuple(embed([query])[0].tolist())
+
+
+def warm_embedding_model() -> bool:
+    """
+    Load the embedding model ahead of the first request. Returns False if it
+    can't be loaded yet (e.g. offline before the first export); get_embedding_model
+    retries on first use.
+    """
+    # Run one encode so ONNX Runtime session setup happens now, not on first upload
     try:
-        client.delete_collection(collection_name)
-    except Exception:
-        pass
-
-    collection = client.create_collection(
-        name=collection_name,
-        metadata={"hnsw:space": "cosine"}
-    )
-
-    texts = [c["text"] for c in chunks]
-    embeddings = model.encode(texts).tolist()
-
-    collection.add(
-        ids=[f"chunk_{i}" for i in range(len(chunks))],
-        embeddings=embeddings,
-        documents=texts,
-        metadatas=[{
-            "page_num": c["page_num"],
-            "chunk_index": c["chunk_index"],
-        } for c in chunks]
+        embed(["warmup"])
+    except Exception as e:
+        logger.warning("Embedding model warm-up failed: %s", e)
+        return False
+    return True
+
+
+def delete_document_embeddings(db: Session, document_id: int) -> None:
+    """Drop all stored chunk embeddings for a document (caller commits)."""
+    db.execute(
+        text("DELETE FROM chunk_vec WHERE document_id = :document_id"),
+        {"document_id": document_id},
     )
 
 
-def find_relevant_chunks(query: str, document_id: int, top_k: int = 3) -> List[dict]:
+def embed_chunks(chunks: List[dict]) -> np.ndarray:
     """
-    Find the most relevant chunks for a given query using similarity search.
+    Encode document chunks into normalized embeddings.
+    Returns an array of shape (len(chunks), 384) in the same order as chunks.
     """
-    model = get_embedding_model()
-    client = get_chroma_client()
+    # Repeated text (headers/footers on slide decks) is only encoded once
+    unique = {}
+    order = []
+    for c in chunks:
+        order.append(unique.setdefault(c["text"], len(unique)))
 
-    collection_name = f"doc_{document_id}"
-    try:
-        collection = client.get_collection(collection_name)
-    except Exception:
-        return []
+    encoded = embed(list(unique), batch_size=EMBED_BATCH_SIZE)
+    return encoded[order]
+
+
+def store_chunk_embeddings(db: Session, document_id: int, chunk_ids: List[int], embeddings: np.ndarray) -> None:
+    """
+    Store chunk embeddings in the chunk_vec table, keyed by chunks.id (caller commits).
+    Replaces any embeddings previously stored for the document.
+    """
+    delete_document_embeddings(db, document_id)
+    if not chunk_ids:
+        return
+
+    db.execute(
+        text("INSERT INTO chunk_vec(rowid, document_id, embedding) VALUES (:id, :document_id, :embedding)"),
+        [
+            {"id": chunk_id, "document_id": document_id, "embedding": vector.tobytes()}
+            for chunk_id, vector in zip(chunk_ids, embeddings)
+        ],
+    )
 
-    query_embedding = model.encode([query]).tolist()
 
-    results = collection.query(
-        query_embeddings=query_embedding,
-        n_results=top_k
+def embed_missing_chunks(db: Session) -> int:
+    """
+    Embed chunks that have no vector yet, e.g. documents uploaded while
+    embeddings were kept in ChromaDB. Commits; returns the number embedded.
+    """
+    rows = db.execute(text(
+        "SELECT id, document_id, text FROM chunks WHERE id NOT IN (SELECT rowid FROM chunk_vec)"
+    )).all()
+    if not rows:
+        return 0
+
+    embeddings = embed_chunks([{"text": row.text} for row in rows])
+    db.execute(
+        text("INSERT INTO chunk_vec(rowid, document_id, embedding) VALUES (:id, :document_id, :embedding)"),
+        [
+            {"id": row.id, "document_id": row.document_id, "embedding": vector.tobytes()}
+            for row, vector in zip(rows, embeddings)
+        ],
     )
+    db.commit()
+    return len(rows)
 
-    chunks = []
-    if results and results["documents"]:
-        for i, doc in enumerate(results["documents"][0]):
-            chunks.append({
-                "text": doc,
-                "metadata": results["metadatas"][0][i] if results["metadatas"] else {},
-                "distance": results["distances"][0][i] if results["distances"] else 0,
-            })
 
-    return chunks
+def find_relevant_chunks(db: Session, query: str, document_id: int, top_k: int = 3) -> List[dict]:
+    """
+    Find the most relevant chunks for a given query using similarity search.
+    Both stored and query embeddings are unit-length; distance is reported as cosine distance.
+    """
+    query_embedding = np.asarray(_embed_query(query), dtype=np.float32)
+
+    rows = db.execute(
+        text("""
+            WITH knn AS (
+                SELECT rowid, distance FROM chunk_vec
+                WHERE embedding MATCH :embedding AND k = :k AND document_id = :document_id
+            )
+            SELECT c.text, c.page_num, c.chunk_index,
+                   knn.distance * knn.distance / 2 AS distance  -- cosine distance for unit vectors
+            FROM knn JOIN chunks c ON c.id = knn.rowid
+            ORDER BY knn.distance
+        """),
+        {"embedding": query_embedding.tobytes(), "k": top_k, "document_id": document_id},
+    ).all()
+
+    return [
+        {
+            "text": row.text,
+            "metadata": {"page_num": row.page_num, "chunk_index": row.chunk_index},
+            "distance": row.distance,
+        }
+        for row in rows
+    ]
@@ -1,30 +1,299 @@
 """
 LLM service — Ollama wrapper for quiz generation, Socratic hints, and answer evaluation
 """
+import asyncio
+import hashlib
 import json
+import logging
+import os
 import re
+import threading
+import time
+from functools import lru_cache
+import diskcache
+import faiss
 import ollama
-from typing import Optional
+from rapidfuzz import fuzz
+from rapidfuzz.utils import default_process
+import tiktoken
+from typing import Iterator, List, Optional, Tuple
+from services.embedding import embed, fits_embedding_window
+
+logger = logging.getLogger(__name__)
 
 MODEL_NAME = "mistral"  # Will use mistral:7b-instruct via Ollama
+NUM_CTX = 4096  # fixed context window, so requests never make the server reload the model
+# How long Ollama keeps the model resident after a request. Every request resets
+# the timer, so all calls (and the startup warm-up) send the same value
+KEEP_ALIVE = "24h"
+OLLAMA_NUM_PARALLEL = 8  # in-flight requests per batch; matches the OLLAMA_NUM_PARALLEL the README starts the server with
+
+# One client for the process so HTTP connections are pooled and reused
+_client = ollama.Client()
+
+LLM_CACHE_DIR = "./.llmcache"
+CACHE_MAX_TEMPERATURE = 0.5  # hotter calls (quiz generation, hints) are meant to vary, so skip the cache
+SEMANTIC_CACHE_THRESHOLD = 0.95  # min cosine similarity for a semantic cache hit
+TOPIC_MAX_TOKENS = 1024  # prompt budget for the text sent to topic extraction
+TOPIC_MAX_CHARS = 2000  # same budget by characters, used when the tokenizer can't be loaded
+TIKTOKEN_CACHE_DIR = "./.tiktoken"  # persistent, so the BPE file survives reboots (tiktoken defaults to the temp dir)
+FUZZY_MATCH_THRESHOLD = 0.7  # min token-set ratio to accept an answer when the evaluator's JSON is unusable
+
+# Streaming: flush after 1, 3, 9, 27, then every 50 tokens, or after 200ms
+DEFAULT_BATCH_SIZE = 50
+STREAM_BATCH_GROWTH = 3
+STREAM_FLUSH_SECONDS = 0.2
+
+# Exact-match response cache on disk, keyed by sha256 of prompt + model + temperature
+_response_cache = diskcache.Cache(LLM_CACHE_DIR)
+# Semantic layer (in-process): one FAISS inner-product index per context, i.e.
+# per (system prompt, model, temperature), so a user prompt only matches prompts
+# asked under the same instructions. Values are (index, exact cache keys by row).
+_semantic_indexes = {}
+_semantic_lock = threading.Lock()
+
+
+def _messages(system_prompt: str, user_prompt: str) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def _options(temperature: float) -> dict:
+    return {"num_ctx": NUM_CTX, "temperature": temperature}
+
 
+def _cache_key(system_prompt: str, user_prompt: str, temperature: float) -> str:
+    return hashlib.sha256((system_prompt + user_prompt + MODEL_NAME + str(temperature)).encode()).hexdigest()
 
-def _chat(system_prompt: str, user_prompt: str, temperature: float = 0.7) -> str:
-    """Send a chat request to the local Ollama model."""
+
+def _context_key(system_prompt: str, temperature: float) -> str:
+    return hashlib.sha256((system_prompt + MODEL_NAME + str(temperature)).encode()).hexdigest()
+
+
+def _semantic_key_usable(semantic_text: Optional[str]) -> bool:
+    # Past the embedder's window, texts differing only after a shared opening
+    # (course headers, title slides) would embed identically, so such inputs
+    # only use the exact cache. In practice the semantic layer therefore only
+    # serves short inputs, e.g. topic extraction for very small documents
+    return semantic_text is not None and fits_embedding_window(semantic_text)
+
+
+def _cache_lookup(system_prompt: str, user_prompt: str, temperature: float, semantic_text: Optional[str]) -> Optional[str]:
+    """
+    Return a cached response: exact hash match first, then, when semantic_text is
+    given, the response whose semantic_text is most similar under the same context.
+    """
+    cached = _response_cache.get(_cache_key(system_prompt, user_prompt, temperature))
+    if cached is not None or not _semantic_key_usable(semantic_text):
+        return cached
+
+    with _semantic_lock:
+        entry = _semantic_indexes.get(_context_key(system_prompt, temperature))
+        if entry is None:
+            return None
+        index, keys = entry
+        scores, ids = index.search(embed([semantic_text]), 1)
+        if scores[0][0] < SEMANTIC_CACHE_THRESHOLD:
+            return None
+        return _response_cache.get(keys[ids[0][0]])
+
+
+def _cache_store(system_prompt: str, user_prompt: str, temperature: float, semantic_text: Optional[str], response: str) -> None:
+    key = _cache_key(system_prompt, user_prompt, temperature)
+    _response_cache.set(key, response)
+    if not _semantic_key_usable(semantic_text):
+        return
+
+    vector = embed([semantic_text])
+    with _semantic_lock:
+        context = _context_key(system_prompt, temperature)
+        if context not in _semantic_indexes:
+            _semantic_indexes[context] = (faiss.IndexFlatIP(vector.shape[1]), [])
+        index, keys = _semantic_indexes[context]
+        index.add(vector)
+        keys.append(key)
+
+
+def warm_model() -> bool:
+    """
+    Load the model into Ollama with a 1-token generation so the first user
+    request doesn't pay the model load. Returns False if Ollama is unreachable.
+    """
     try:
-        response = ollama.chat(
+        _client.generate(model=MODEL_NAME, prompt="ok", options={"num_ctx": NUM_CTX, "num_predict": 1}, keep_alive=KEEP_ALIVE)
+    except Exception as e:
+        logger.warning("LLM warm-up failed: %s", e)
+        return False
+    return True
+
+
+def _chat(system_prompt: str, user_prompt: str, temperature: float = 0.7, semantic_text: Optional[str] = None) -> str:
+    """
+    Send a chat request to the local Ollama model.
+    Low-temperature calls are served from the response cache when possible.
+    semantic_text is the variable input inside user_prompt (embedding the whole
+    prompt would mostly compare the fixed template); when given and short enough to
+    embed whole, near-duplicate inputs may reuse a cached response.
+    """
+    cacheable = temperature <= CACHE_MAX_TEMPERATURE
+    if cacheable:
+        cached = _cache_lookup(system_prompt, user_prompt, temperature, semantic_text)
+        if cached is not None:
+            return cached
+
+    try:
+        response = _client.chat(
             model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            options={"temperature": temperature}
+            messages=_messages(system_prompt, user_prompt),
+            options=_options(temperature),
+            keep_alive=KEEP_ALIVE,
         )
-        return response["message"]["content"]
+        content = response["message"]["content"]
     except Exception as e:
-        print(f"[LLM ERROR] {e}")
+        logger.error("LLM request failed: %s", e)
         return ""
 
+    if cacheable and content:
+        _cache_store(system_prompt, user_prompt, temperature, semantic_text, content)
+    return content
+
+
+def _chat_stream(system_prompt: str, user_prompt: str, temperature: float = 0.7) -> Iterator[str]:
+    """
+    Stream a chat response, yielding text in growing batches of tokens:
+    the first token goes out immediately, later flushes carry up to
+    DEFAULT_BATCH_SIZE tokens or whatever arrived within STREAM_FLUSH_SECONDS.
+    """
+    buffer = []
+    batch_size = 1
+    last_flush = time.monotonic()
+    try:
+        for chunk in _client.chat(
+            model=MODEL_NAME,
+            messages=_messages(system_prompt, user_prompt),
+            options=_options(temperature),
+            keep_alive=KEEP_ALIVE,
+            stream=True,
+        ):
+            buffer.append(chunk["message"]["content"])
+            if len(buffer) >= batch_size or time.monotonic() - last_flush >= STREAM_FLUSH_SECONDS:
+                yield "".join(buffer)
+                buffer.clear()
+                batch_size = min(batch_size * STREAM_BATCH_GROWTH, DEFAULT_BATCH_SIZE)
+                last_flush = time.monotonic()
+    except Exception as e:
+        logger.error("LLM stream failed: %s", e)
+    if buffer:
+        yield "".join(buffer)
+
+
+async def _achat(client: ollama.AsyncClient, system_prompt: str, user_prompt: str, temperature: float = 0.7) -> str:
+    """Async counterpart of _chat, sent through the given AsyncClient."""
+    response = await client.chat(
+        model=MODEL_NAME,
+        messages=_messages(system_prompt, user_prompt),
+        options=_options(temperature),
+        keep_alive=KEEP_ALIVE,
+    )
+    return response["message"]["content"]
+
+
+async def _achat_many(
+    pairs: List[Tuple[str, str]],
+    temperature: float = 0.7,
+    semantic_texts: Optional[List[str]] = None,
+) -> List[str]:
+    """
+    Send many (system_prompt, user_prompt) pairs concurrently, at most
+    OLLAMA_NUM_PARALLEL at a time so each fills one of the server's parallel slots.
+    Cached pairs are answered without a request, as in _chat (semantic_texts
+    gives each pair's semantic_text). Failed requests come back as "" like _chat.
+    """
+    cacheable = temperature <= CACHE_MAX_TEMPERATURE
+    semantic_texts = semantic_texts or [None] * len(pairs)
+    responses = [None] * len(pairs)
+    if cacheable:
+        for i, (system_prompt, user_prompt) in enumerate(pairs):
+            responses[i] = _cache_lookup(system_prompt, user_prompt, temperature, semantic_texts[i])
+    pending = [i for i, response in enumerate(responses) if response is None]
+
+    # One client per batch: its HTTP pool is bound to the event loop running this batch
+    client = ollama.AsyncClient()
+    # Requests beyond the server's parallel slots would only queue there and hit timeouts
+    slots = asyncio.Semaphore(OLLAMA_NUM_PARALLEL)
+
+    async def limited(i: int) -> str:
+        async with slots:
+            return await _achat(client, *pairs[i], temperature)
+
+    try:
+        results = await asyncio.gather(*[limited(i) for i in pending], return_exceptions=True)
+    finally:
+        # ollama 0.3 exposes no close(); shut the underlying httpx client so its connections aren't leaked
+        await client._client.aclose()
+    for i, result in zip(pending, results):
+        if isinstance(result, Exception):
+            logger.error("LLM request failed: %s", result)
+            responses[i] = ""
+        else:
+            responses[i] = result
+            if cacheable and result:
+                _cache_store(*pairs[i], temperature, semantic_texts[i], result)
+    return responses
+
+
+# Characters that can change bracket depth or string state while scanning for JSON
+_JSON_STRUCTURAL_RE = re.compile(r'[{}\[\]"\\]')
+
+
+def _json_spans(text: str) -> List[Tuple[int, int, int]]:
+    """
+    Find every balanced JSON-like array/object in one linear pass.
+    A stack of open brackets pairs each closer with its opener, skipping brackets
+    inside string literals (honouring escapes). Openers that never close (e.g.
+    the "[" in "range [0, 1)") simply stay on the stack and don't block later spans.
+    Returns (begin, end, nesting level) for each span, ordered by begin.
+    """
+    spans = []
+    stack = []  # (position, expected closer)
+    in_string = False
+    pos = 0
+    # Jump between structural characters instead of visiting every character
+    while (match := _JSON_STRUCTURAL_RE.search(text, pos)) is not None:
+        i = match.start()
+        ch = text[i]
+        pos = i + 1
+        if in_string:
+            if ch == "\\":
+                pos = i + 2  # skip the escaped character
+            elif ch == '"':
+                in_string = False
+        elif ch == "{":
+            stack.append((i, "}"))
+        elif ch == "[":
+            stack.append((i, "]"))
+        elif not stack:
+            continue  # quotes and closers outside any bracket are prose
+        elif ch == '"':
+            in_string = True
+        elif ch == stack[-1][1]:
+            spans.append((stack.pop()[0], i + 1))
+        elif ch in "}]":
+            stack.clear()  # mismatched closer: nothing open can be valid JSON
+
+    # Matched spans are nested or disjoint; number their nesting levels
+    spans.sort()
+    result = []
+    enclosing_ends = []
+    for begin, end in spans:
+        while enclosing_ends and enclosing_ends[-1] <= begin:
+            enclosing_ends.pop()
+        result.append((begin, end, len(enclosing_ends)))
+        enclosing_ends.append(end)
+    return result
+
 
 def _extract_json(text: str) -> Optional[dict]:
     """Try to extract JSON from LLM response."""
@@ -35,40 +304,35 @@ def _extract_json(text: str) -> Optional[dict]:
         pass
 
     # Try to find JSON in markdown code blocks
-    json_match = re.search(r'```(?:json)?\s*\n?([\s\S]*?)\n?```', text)
-    if json_match:
-        try:
-            return json.loads(json_match.group(1))
-        except json.JSONDecodeError:
-            pass
-
-    # Try to find JSON array or object
-    for pattern in [r'\[[\s\S]*\]', r'\{[\s\S]*\}']:
-        match = re.search(pattern, text)
-        if match:
+    fence = text.find("```")
+    if fence != -1:
+        fence_end = text.find("```", fence + 3)
+        if fence_end != -1:
+            block = text[fence + 3:fence_end]
+            if block.startswith("json"):
+                block = block[4:]
             try:
-                return json.loads(match.group())
+                return json.loads(block)
             except json.JSONDecodeError:
                 pass
 
-    return None
-
-
-def generate_quiz(context: str, num_questions: int = 5, difficulty: str = "medium") -> list:
-    """
-    Generate quiz questions from a given context.
-    Returns list of question dicts with: question_text, question_type, options, correct_answer, explanation, hints
-    """
-    system_prompt = """You are an expert educational quiz generator. Generate questions that test understanding, not just memorization.
-Your output MUST be valid JSON — an array of question objects. No markdown, no explanation outside the JSON."""
+    # Try the balanced arrays/objects in order: outermost first, then the ones
+    # directly inside them. Spans of one level are disjoint, so each level
+    # parses at most the length of the text
+    spans = _json_spans(text)
+    for level in (0, 1):
+        for begin, end, span_level in spans:
+            if span_level != level:
+                continue
+            try:
+                return json.loads(text[begin:end])
+            except json.JSONDecodeError:
+                pass
 
-    user_prompt = f"""Based on the following study material, generate exactly {num_questions} quiz questions at {difficulty} difficulty level.
+    return None
 
-STUDY MATERIAL:
-{context}
 
-Return ONLY a JSON array where each element has these exact fields:
-{{
+_QUESTION_FIELDS = """{
   "question_text": "The question",
   "question_type": "mcq" or "short_answer",
   "options": ["A) ...", "B) ...", "C) ...", "D) ..."] (only for mcq, null for short_answer),
@@ -77,27 +341,31 @@ Return ONLY a JSON array where each element has these exact fields:
   "hint_1": "A vague conceptual hint that points to the right topic area",
   "hint_2": "A more specific hint that narrows down the approach",
   "hint_3": "A near-complete explanation leaving only the final connection"
-}}
-
-Make {max(1, num_questions // 3)} questions short_answer type and the rest mcq.
+}"""
+
+_FALLBACK_QUESTION = {
+    "question_text": "What is the main concept discussed in this material?",
+    "question_type": "short_answer",
+    "options": None,
+    "correct_answer": "The main concept from the study material",
+    "explanation": "This is a fallback question generated when the AI had trouble creating specific questions.",
+    "hint_1": "Think about the primary topic covered.",
+    "hint_2": "Focus on the key definitions or principles mentioned.",
+    "hint_3": "Review the opening paragraphs for the central theme.",
+}
+
+
+def _question_rules(num_questions: int) -> str:
+    return f"""Make {max(1, num_questions // 3)} questions short_answer type and the rest mcq.
 Ensure hints follow the Socratic method — guide thinking, never reveal the answer.
 Generate EXACTLY {num_questions} questions. Return ONLY valid JSON."""
 
-    response = _chat(system_prompt, user_prompt, temperature=0.7)
-    result = _extract_json(response)
 
+def _parse_questions(result) -> list:
+    """Normalize extracted JSON into a list of question dicts."""
     if result is None:
         # Fallback: generate a simple question
-        return [{
-            "question_text": "What is the main concept discussed in this material?",
-            "question_type": "short_answer",
-            "options": None,
-            "correct_answer": "The main concept from the study material",
-            "explanation": "This is a fallback question generated when the AI had trouble creating specific questions.",
-            "hint_1": "Think about the primary topic covered.",
-            "hint_2": "Focus on the key definitions or principles mentioned.",
-            "hint_3": "Review the opening paragraphs for the central theme.",
-        }]
+        return [dict(_FALLBACK_QUESTION)]
 
     if isinstance(result, dict):
         # Sometimes LLM wraps in {"questions": [...]}
@@ -108,36 +376,111 @@ Generate EXACTLY {num_questions} questions. Return ONLY valid JSON."""
     return result if isinstance(result, list) else [result]
 
 
-def generate_hint(question_text: str, correct_answer: str, hint_level: int, context: str = "") -> str:
+def is_fallback_quiz(questions: list) -> bool:
+    """True if generate_quiz returned its placeholder question because the LLM output was unusable."""
+    return len(questions) == 1 and questions[0] == _FALLBACK_QUESTION
+
+
+def generate_quiz(context: str, num_questions: int = 5, difficulty: str = "medium") -> list:
     """
-    Generate a Socratic hint at the specified level (1-3).
-    Level 1: Vague conceptual direction
-    Level 2: More specific, narrows approach
-    Level 3: Near-complete, leaves final step
+    Generate quiz questions from a given context.
+    Returns list of question dicts with: question_text, question_type, options, correct_answer, explanation, hints
+    """
+    system_prompt = """You are an expert educational quiz generator. Generate questions that test understanding, not just memorization.
+Your output MUST be valid JSON — an array of question objects. No markdown, no explanation outside the JSON."""
+
+    user_prompt = f"""Based on the following study material, generate exactly {num_questions} quiz questions at {difficulty} difficulty level.
+
+STUDY MATERIAL:
+{context}
+
+Return ONLY a JSON array where each element has these exact fields:
+{_QUESTION_FIELDS}
+
+{_question_rules(num_questions)}"""
+
+    response = _chat(system_prompt, user_prompt, temperature=0.7)
+    return _parse_questions(_extract_json(response))
+
+
+def generate_quiz_with_topics(context: str, num_questions: int = 5, difficulty: str = "medium") -> dict:
+    """
+    Generate quiz questions and extract topics from the same context in one LLM call.
+    Saves a full model round-trip over calling generate_quiz and extract_topics separately.
+    Returns {"topics": [str], "questions": [question dicts as from generate_quiz]}
     """
-    level_descriptions = {
-        1: "Give a VAGUE conceptual hint. Point to the general topic area without mentioning specific terms from the answer. Be encouraging.",
-        2: "Give a MORE SPECIFIC hint. Narrow down the approach. You may reference related concepts but do NOT reveal the answer.",
-        3: "Give a DETAILED hint that explains the reasoning step by step, leaving only the final conclusion for the student to make.",
+    system_prompt = """You are an expert educational quiz generator. You identify the key topics of study material and generate questions that test understanding, not just memorization.
+Your output MUST be valid JSON — a single object. No markdown, no explanation outside the JSON."""
+
+    user_prompt = f"""Based on the following study material, identify 3-7 distinct topics it covers and generate exactly {num_questions} quiz questions at {difficulty} difficulty level.
+
+STUDY MATERIAL:
+{context}
+
+Return ONLY a JSON object of this shape:
+{{
+  "topics": ["Short topic name (2-5 words)", ...],
+  "questions": [ ... ]
+}}
+where each element of "questions" has these exact fields:
+{_QUESTION_FIELDS}
+
+{_question_rules(num_questions)}"""
+
+    response = _chat(system_prompt, user_prompt, temperature=0.7)
+    result = _extract_json(response)
+
+    topics = result.get("topics") if isinstance(result, dict) else None
+    questions = result.get("questions") if isinstance(result, dict) else result
+    return {
+        "topics": _clean_topics(topics),
+        "questions": _parse_questions(questions),
     }
 
+
+# Hint instructions for levels 1-3, indexed by hint_level - 1
+_LEVEL_DESCRIPTIONS = (
+    "Give a VAGUE conceptual hint. Point to the general topic area without mentioning specific terms from the answer. Be encouraging.",
+    "Give a MORE SPECIFIC hint. Narrow down the approach. You may reference related concepts but do NOT reveal the answer.",
+    "Give a DETAILED hint that explains the reasoning step by step, leaving only the final conclusion for the student to make.",
+)
+
+
+def _hint_prompts(question_text: str, correct_answer: str, hint_level: int) -> Tuple[str, str]:
+    """Build (system, user) prompts for a Socratic hint at the given level."""
     system_prompt = "You are a Socratic tutor. Your job is to GUIDE students to discover answers themselves. NEVER reveal the answer directly. Be warm, encouraging, and concise (2-3 sentences max)."
 
     user_prompt = f"""Question: {question_text}
 Correct answer (DO NOT reveal this): {correct_answer}
 
-{level_descriptions.get(hint_level, level_descriptions[1])}
+{_LEVEL_DESCRIPTIONS[max(0, min(2, hint_level - 1))]}
 
 Respond with ONLY the hint text, nothing else."""
 
+    return system_prompt, user_prompt
+
+
+def generate_hint(question_text: str, correct_answer: str, hint_level: int, context: str = "") -> str:
+    """
+    Generate a Socratic hint at the specified level (1-3).
+    Level 1: Vague conceptual direction
+    Level 2: More specific, narrows approach
+    Level 3: Near-complete, leaves final step
+    """
+    system_prompt, user_prompt = _hint_prompts(question_text, correct_answer, hint_level)
     return _chat(system_prompt, user_prompt, temperature=0.6)
 
 
-def evaluate_answer(question_text: str, correct_answer: str, user_answer: str) -> dict:
+def stream_hint(question_text: str, correct_answer: str, hint_level: int, context: str = "") -> Iterator[str]:
     """
-    Evaluate a user's answer with partial credit scoring.
-    Returns {"is_correct": bool, "score": 0.0-1.0, "feedback": str}
+    Streaming variant of generate_hint for interactive use; yields hint text
+    as it is generated, in token batches (see _chat_stream).
     """
+    system_prompt, user_prompt = _hint_prompts(question_text, correct_answer, hint_level)
+    yield from _chat_stream(system_prompt, user_prompt, temperature=0.6)
+
+
+def _evaluation_prompts(question_text: str, correct_answer: str, user_answer: str) -> Tuple[str, str]:
     system_prompt = """You are a fair exam grader. Evaluate the student's answer against the correct answer.
 Consider partial credit for answers that show understanding even if not perfectly worded.
 Return ONLY valid JSON."""
@@ -153,39 +496,119 @@ Return JSON with exactly these fields:
   "feedback": "Brief encouraging feedback explaining what was right/wrong"
 }}"""
 
-    response = _chat(system_prompt, user_prompt, temperature=0.3)
+    return system_prompt, user_prompt
+
+
+def _parse_evaluation(response: str, correct_answer: str, user_answer: str) -> dict:
     result = _extract_json(response)
 
     if result is None:
-        # Fallback: simple string matching
-        is_correct = correct_answer.lower().strip() in user_answer.lower().strip() or \
-                     user_answer.lower().strip() in correct_answer.lower().strip()
+        # Fallback: fuzzy token-set match (order- and punctuation-insensitive)
+        ratio = fuzz.token_set_ratio(correct_answer, user_answer, processor=default_process) / 100.0
+        is_correct = ratio >= FUZZY_MATCH_THRESHOLD
         return {
             "is_correct": is_correct,
-            "score": 1.0 if is_correct else 0.0,
+            "score": round(ratio, 2),
             "feedback": "Correct! Great job!" if is_correct else f"Not quite. The correct answer is: {correct_answer}"
         }
 
     return result
 
 
-def extract_topics(text: str) -> list:
+def evaluate_answer(question_text: str, correct_answer: str, user_answer: str) -> dict:
     """
-    Extract topic names from a text chunk using LLM.
-    Returns a list of topic strings.
+    Evaluate a user's answer with partial credit scoring.
+    Returns {"is_correct": bool, "score": 0.0-1.0, "feedback": str}
+    """
+    # Exact cache only: a semantic hit could reuse the grade of a different answer
+    response = _chat(*_evaluation_prompts(question_text, correct_answer, user_answer), temperature=0.3)
+    return _parse_evaluation(response, correct_answer, user_answer)
+
+
+def evaluate_answers(items: List[dict]) -> List[dict]:
+    """
+    Evaluate many answers concurrently.
+    items: [{"question_text", "correct_answer", "user_answer"}, ...]; results keep the same order.
+    Runs its own event loop, so call it from sync code or a threadpool, not from a coroutine.
     """
+    pairs = [
+        _evaluation_prompts(item["question_text"], item["correct_answer"], item["user_answer"])
+        for item in items
+    ]
+    responses = asyncio.run(_achat_many(pairs, temperature=0.3))
+    return [
+        _parse_evaluation(response, item["correct_answer"], item["user_answer"])
+        for response, item in zip(responses, items)
+    ]
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Optional[tiktoken.Encoding]:
+    """
+    Tokenizer for prompt budgets, loaded on first use. tiktoken downloads the BPE
+    file once into TIKTOKEN_CACHE_DIR; if that fails (e.g. offline before the
+    first download) returns None and callers fall back to a character cut.
+    Mistral's own vocabulary differs slightly, but counts are close enough to cap prompt-eval work.
+    """
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", TIKTOKEN_CACHE_DIR)
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("Tokenizer unavailable, truncating prompts by characters: %s", e)
+        return None
+
+
+def _truncate_tokens(text: str, max_tokens: int, fallback_chars: int) -> str:
+    """Cut text to at most max_tokens tokens (fallback_chars characters without a tokenizer)."""
+    enc = _encoding()
+    if enc is None:
+        return text[:fallback_chars]
+    # Tokens rarely span more than a few characters; bound the encode on huge inputs
+    text = text[:max_tokens * 16]
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens])
+
+
+def _topic_prompts(text: str) -> Tuple[str, str]:
     system_prompt = "You extract key topics from educational content. Return ONLY a JSON array of topic name strings."
 
     user_prompt = f"""From the following educational text, identify 3-7 distinct topics or subjects that are covered.
 Return ONLY a JSON array of short topic names (2-5 words each).
 
 TEXT:
-{text[:2000]}"""
+{_truncate_tokens(text, TOPIC_MAX_TOKENS, TOPIC_MAX_CHARS)}"""
 
-    response = _chat(system_prompt, user_prompt, temperature=0.3)
-    result = _extract_json(response)
+    return system_prompt, user_prompt
 
+
+def _clean_topics(result) -> list:
     if result and isinstance(result, list):
         return [str(t) for t in result[:7]]
 
     return ["General"]
+
+
+def _parse_topics(response: str) -> list:
+    return _clean_topics(_extract_json(response))
+
+
+def extract_topics(text: str) -> list:
+    """
+    Extract topic names from a text chunk using LLM.
+    Returns a list of topic strings.
+    """
+    response = _chat(*_topic_prompts(text), temperature=0.3, semantic_text=text)
+    return _parse_topics(response)
+
+
+def extract_topics_batch(texts: List[str]) -> List[list]:
+    """
+    Extract topics from many texts concurrently; results keep the same order.
+    Runs its own event loop, so call it from sync code or a threadpool, not from a coroutine.
+    """
+    responses = asyncio.run(_achat_many(
+        [_topic_prompts(text) for text in texts], temperature=0.3, semantic_texts=texts
+    ))
+    return [_parse_topics(response) for response in responses]
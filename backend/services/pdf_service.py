@@ -1,57 +1,126 @@
 """
 PDF parsing and chunking service for LearnLens
 """
+import hashlib
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
-from typing import List, Tuple
+from typing import Iterator, List, Tuple, Union
 
+# Minimum pages per extraction process; smaller PDFs are parsed serially
+PAGES_PER_WORKER = 16
 
-def parse_pdf(file_bytes: bytes) -> List[Tuple[int, str]]:
-    """
-    Parse a PDF file and return a list of (page_num, text) tuples.
-    """
-    doc = fitz.open(stream=file_bytes, filetype="pdf")
+_pool = None
+_pool_lock = threading.Lock()
+
+# Plain-text extraction without ligature and whitespace preservation (chunking
+# splits on whitespace anyway), joining words hyphenated across line breaks
+_TEXT_FLAGS = (
+    fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_LIGATURES & ~fitz.TEXT_PRESERVE_WHITESPACE
+) | fitz.TEXT_DEHYPHENATE
+
+_WORD_RE = re.compile(r"\S+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def content_hash(text: str) -> str:
+    """Hash of case- and whitespace-normalized text; identical content from different uploads matches."""
+    normalized = _WHITESPACE_RE.sub(" ", text.lower()).strip()
+    return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+
+def _open_pdf(source: Union[bytes, str]) -> fitz.Document:
+    """Open a PDF from raw bytes or from a file path (read lazily by MuPDF)."""
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _extract_page_range(source: Union[bytes, str], first: int, last: int) -> List[Tuple[int, str]]:
+    """Extract pages [first, last) of a PDF opened by this call."""
+    doc = _open_pdf(source)
     pages = []
-    for page_num in range(len(doc)):
+    for page_num in range(first, last):
         page = doc[page_num]
-        text = page.get_text("text").strip()
+        # A page with no content stream is blank; skip text extraction entirely
+        if not page.get_contents():
+            continue
+        text = page.get_text("text", flags=_TEXT_FLAGS).strip()
         if text:
             pages.append((page_num + 1, text))
     doc.close()
     return pages
 
 
-def chunk_text(pages: List[Tuple[int, str]], chunk_size: int = 500, overlap: int = 50) -> List[dict]:
+def _extraction_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all uploads, started on first use."""
+    global _pool
+    # parse_pdf runs on request threads; without the lock two concurrent
+    # large uploads could each start (and one leak) a pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the server process is multi-threaded
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def parse_pdf(source: Union[bytes, str]) -> List[Tuple[int, str]]:
+    """
+    Parse a PDF file (bytes or path) and return a list of (page_num, text) tuples.
+    Large PDFs given by path are split into page ranges extracted in worker processes.
+    """
+    doc = _open_pdf(source)
+    page_count = len(doc)
+    doc.close()
+
+    workers = min(os.cpu_count() or 1, page_count // PAGES_PER_WORKER)
+    # Bytes would be pickled to every worker, so only paths fan out
+    if workers <= 1 or not isinstance(source, str):
+        return _extract_page_range(source, 0, page_count)
+
+    # PyMuPDF supports neither threads nor sharing documents, so each
+    # worker process opens the file itself for its range of pages
+    bounds = [page_count * i // workers for i in range(workers + 1)]
+    ranges = _extraction_pool().map(
+        _extract_page_range, [source] * workers, bounds[:-1], bounds[1:]
+    )
+    return [page for pages in ranges for page in pages]
+
+
+def chunk_text(pages: List[Tuple[int, str]], chunk_size: int = 500, overlap: int = 50) -> Iterator[dict]:
     """
     Split extracted pages into overlapping chunks for embedding and quiz generation.
-    Returns list of {"text": str, "page_num": int, "chunk_index": int}
+    Yields {"text": str, "page_num": int, "chunk_index": int, "content_hash": str};
+    wrap in list() when the chunks are needed more than once.
     """
-    chunks = []
     chunk_index = 0
+    step = chunk_size - overlap
 
     for page_num, text in pages:
-        words = text.split()
-        start = 0
-        while start < len(words):
-            end = start + chunk_size
-            chunk_text_str = " ".join(words[start:end])
+        # Character span of every word, so each chunk is one slice of the page
+        spans = [m.span() for m in _WORD_RE.finditer(text)]
+        n = len(spans)
+        for start in range(0, n, step):
+            end = min(start + chunk_size, n)
 
             # Skip very short chunks (less than 30 words)
-            if len(chunk_text_str.split()) >= 30:
-                chunks.append({
-                    "text": chunk_text_str,
+            if end - start >= 30:
+                chunk = text[spans[start][0]:spans[end - 1][1]]
+                yield {
+                    "text": chunk,
                     "page_num": page_num,
                     "chunk_index": chunk_index,
-                })
+                    "content_hash": content_hash(chunk),
+                }
                 chunk_index += 1
 
-            start += chunk_size - overlap
-
-    return chunks
-
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
+def extract_text_from_pdf(source: Union[bytes, str]) -> str:
     """
     Simple full-text extraction from PDF.
     """
-    pages = parse_pdf(file_bytes)
+    pages = parse_pdf(source)
     return "\n\n".join([text for _, text in pages])
@@ -1,20 +1,23 @@
 """
 Quiz engine — SM-2 spaced repetition, XP/streak calculation, difficulty adaptation
 """
+import math
 from datetime import datetime, timedelta
 from typing import Optional
+import numpy as np
+from numba import njit, prange
 
 
-def calculate_sm2(
-    quality: int,  # 0-5 rating (0=complete blackout, 5=perfect)
-    ease_factor: float = 2.5,
-    interval: int = 1,
-    repetitions: int = 0
-) -> dict:
-    """
-    SM-2 spaced repetition algorithm.
-    Returns: {"ease_factor": float, "interval": int (days), "next_review": datetime}
-    """
+# XP multiplier per quiz difficulty
+_DIFF_MULT = {"easy": 1.0, "medium": 1.5, "hard": 2.0}
+
+
+# JIT-compiled numeric cores. The Python-facing functions below wrap these;
+# the batch entry points run them over NumPy arrays for bulk rescheduling.
+
+@njit(cache=True)
+def _sm2_core(quality, ease_factor, interval, repetitions):
+    """Returns (ease_factor, interval in days, repetitions)."""
     if quality >= 3:
         # Correct response
         if repetitions == 0:
@@ -30,17 +33,102 @@ def calculate_sm2(
         # Incorrect — reset
         repetitions = 0
         interval = 1
+    return ease_factor, interval, repetitions
+
+
+@njit(parallel=True, cache=True)
+def _sm2_batch_core(qualities, ease_factors, intervals, repetitions):
+    n = qualities.shape[0]
+    out_ease = np.empty(n, dtype=np.float64)
+    out_interval = np.empty(n, dtype=np.int64)
+    out_reps = np.empty(n, dtype=np.int64)
+    for i in prange(n):
+        ease, interval, reps = _sm2_core(qualities[i], ease_factors[i], intervals[i], repetitions[i])
+        out_ease[i] = ease
+        out_interval[i] = interval
+        out_reps[i] = reps
+    return out_ease, out_interval, out_reps
+
+
+@njit(cache=True)
+def _xp_core(hints_used, multiplier, streak):
+    """XP for a correct answer. Returns (xp, base, hint_penalty, streak_xp)."""
+    base = int(10 * multiplier)
+
+    # Hint penalty (but still positive)
+    hint_penalty = hints_used * 2
+    xp = max(5, base - hint_penalty)
+
+    # Streak bonus (caps at 50%)
+    streak_bonus = min(streak * 0.05, 0.5)
+    streak_xp = int(xp * streak_bonus)
+    return xp + streak_xp, base, hint_penalty, streak_xp
+
 
-    next_review = datetime.utcnow() + timedelta(days=interval)
+@njit(cache=True)
+def _level_core(xp):
+    """Returns (level, xp into the current level, xp needed for the next level)."""
+    level = 1
+    xp_remaining = xp
+    xp_for_level = 100  # Level 1 needs 100 XP
+
+    while xp_remaining >= xp_for_level:
+        xp_remaining -= xp_for_level
+        level += 1
+        xp_for_level = int(xp_for_level * 1.3)  # 30% more each level
+    return level, xp_remaining, xp_for_level
+
+
+def calculate_sm2(
+    quality: int,  # 0-5 rating (0=complete blackout, 5=perfect)
+    ease_factor: float = 2.5,
+    interval: int = 1,
+    repetitions: int = 0
+) -> dict:
+    """
+    SM-2 spaced repetition algorithm.
+    Returns: {"ease_factor": float, "interval": int (days), "next_review": datetime,
+              "next_review_ordinal": int (UTC date ordinal of next_review)}
+    """
+    ease_factor, interval, repetitions = _sm2_core(quality, float(ease_factor), interval, repetitions)
+
+    now = datetime.utcnow()
+    next_review = now + timedelta(days=interval)
 
     return {
         "ease_factor": round(ease_factor, 2),
         "interval": interval,
         "next_review": next_review,
+        "next_review_ordinal": now.toordinal() + interval,
         "repetitions": repetitions,
     }
 
 
+def calculate_sm2_batch(
+    qualities: np.ndarray,
+    ease_factors: np.ndarray,
+    intervals: np.ndarray,
+    repetitions: np.ndarray,
+) -> dict:
+    """
+    Vectorized SM-2 over arrays of cards, for bulk rescheduling jobs.
+    Returns arrays: {"ease_factor", "interval" (days until next review),
+    "next_review_ordinal" (UTC date ordinal, date.fromordinal() to convert), "repetitions"}
+    """
+    ease, interval, reps = _sm2_batch_core(
+        np.asarray(qualities, dtype=np.int64),
+        np.asarray(ease_factors, dtype=np.float64),
+        np.asarray(intervals, dtype=np.int64),
+        np.asarray(repetitions, dtype=np.int64),
+    )
+    return {
+        "ease_factor": np.round(ease, 2),
+        "interval": interval,
+        "next_review_ordinal": datetime.utcnow().toordinal() + interval,
+        "repetitions": reps,
+    }
+
+
 def calculate_xp(
     is_correct: bool,
     hints_used: int = 0,
@@ -51,10 +139,6 @@ def calculate_xp(
     Calculate XP earned for answering a question.
     Returns: {"xp_earned": int, "breakdown": dict}
     """
-    # Base XP
-    difficulty_multiplier = {"easy": 1.0, "medium": 1.5, "hard": 2.0}
-    base_xp = 10
-
     if not is_correct:
         return {
             "xp_earned": 2,  # Participation XP
@@ -62,22 +146,13 @@ def calculate_xp(
         }
 
     # Correct answer bonuses
-    multiplier = difficulty_multiplier.get(difficulty, 1.5)
-    xp = int(base_xp * multiplier)
-
-    # Hint penalty (but still positive)
-    hint_penalty = hints_used * 2
-    xp = max(5, xp - hint_penalty)
-
-    # Streak bonus (caps at 50%)
-    streak_bonus = min(streak * 0.05, 0.5)
-    streak_xp = int(xp * streak_bonus)
-    xp += streak_xp
+    multiplier = _DIFF_MULT.get(difficulty, 1.5)
+    xp, base, hint_penalty, streak_xp = _xp_core(hints_used, multiplier, streak)
 
     return {
         "xp_earned": xp,
         "breakdown": {
-            "base": int(base_xp * multiplier),
+            "base": base,
             "hint_penalty": -hint_penalty,
             "streak_bonus": streak_xp,
             "difficulty": difficulty,
@@ -85,20 +160,38 @@ def calculate_xp(
     }
 
 
+def _build_level_table(max_xp: int = 10**15) -> tuple:
+    """Cumulative XP at the start of each level and each level's cost, matching _level_core."""
+    starts, costs = [0], []
+    xp_for_level = 100
+    while starts[-1] < max_xp:
+        costs.append(xp_for_level)
+        starts.append(starts[-1] + xp_for_level)
+        xp_for_level = int(xp_for_level * 1.3)
+    return tuple(starts), tuple(costs)
+
+
+_LEVEL_STARTS, _LEVEL_COSTS = _build_level_table()
+
+
 def get_level(xp: int) -> dict:
     """
     Calculate level from XP.
     Each level requires progressively more XP.
     Returns: {"level": int, "xp_for_current": int, "xp_for_next": int, "progress": float}
     """
-    level = 1
-    xp_remaining = xp
-    xp_for_level = 100  # Level 1 needs 100 XP
-
-    while xp_remaining >= xp_for_level:
-        xp_remaining -= xp_for_level
-        level += 1
-        xp_for_level = int(xp_for_level * 1.3)  # 30% more each level
+    if xp < _LEVEL_STARTS[1] or xp >= _LEVEL_STARTS[-1]:
+        level, xp_remaining, xp_for_level = _level_core(xp)
+    else:
+        # Closed-form estimate, then correct for int() truncation drift
+        level = int(math.log(1 + xp * 0.003, 1.3)) + 1
+        level = min(max(level, 1), len(_LEVEL_STARTS) - 1)
+        while _LEVEL_STARTS[level - 1] > xp:
+            level -= 1
+        while _LEVEL_STARTS[level] <= xp:
+            level += 1
+        xp_remaining = xp - _LEVEL_STARTS[level - 1]
+        xp_for_level = _LEVEL_COSTS[level - 1]
 
     return {
         "level": level,
@@ -114,23 +207,38 @@ def update_streak(last_active: Optional[datetime]) -> dict:
     Update study streak based on last active date.
     Returns: {"streak": int, "streak_maintained": bool}
     """
-    now = datetime.utcnow()
-
     if last_active is None:
         return {"streak": 1, "streak_maintained": True}
 
+    days_since = datetime.utcnow().toordinal() - last_active.toordinal()
+
     # Check if last active was today
-    if last_active.date() == now.date():
+    if days_since == 0:
         return {"streak": -1, "streak_maintained": True}  # -1 = no change needed
 
     # Check if last active was yesterday
-    if last_active.date() == (now - timedelta(days=1)).date():
+    if days_since == 1:
         return {"streak": 1, "streak_maintained": True}  # Increment by 1
 
     # Streak broken
     return {"streak": 1, "streak_maintained": False}  # Reset to 1
 
 
+def update_streak_batch(last_active_ordinals: np.ndarray) -> dict:
+    """
+    Vectorized update_streak over date ordinals (date.toordinal()), e.g. for a
+    nightly job across all users; 0 means never active.
+    Returns arrays: {"streak", "streak_maintained"} with update_streak's values.
+    """
+    last = np.asarray(last_active_ordinals, dtype=np.int64)
+    days_since = datetime.utcnow().toordinal() - last
+    never = last == 0
+    return {
+        "streak": np.where(days_since == 0, -1, 1),
+        "streak_maintained": never | (days_since == 0) | (days_since == 1),
+    }
+
+
 def get_adaptive_difficulty(mastery: float) -> str:
     """
     Determine quiz difficulty based on topic mastery.
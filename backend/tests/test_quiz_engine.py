@@ -0,0 +1,52 @@
+"""
+Tests for the closed-form level calculation in services.quiz_engine
+"""
+import pytest
+from services.quiz_engine import get_level, _LEVEL_STARTS
+
+MAX_XP = 10_000_000
+
+
+def _reference_level(xp: int) -> dict:
+    """The original level-by-level loop that get_level replaced."""
+    level = 1
+    xp_remaining = xp
+    xp_for_level = 100
+
+    while xp_remaining >= xp_for_level:
+        xp_remaining -= xp_for_level
+        level += 1
+        xp_for_level = int(xp_for_level * 1.3)
+
+    return {
+        "level": level,
+        "xp_in_level": xp_remaining,
+        "xp_for_next": xp_for_level,
+        "progress": round(xp_remaining / xp_for_level, 2),
+        "total_xp": xp,
+    }
+
+
+def _boundary_xp():
+    # get_level is piecewise linear between level thresholds, so checking
+    # every threshold and its neighbours covers each branch of the estimate
+    for start in _LEVEL_STARTS:
+        if start > MAX_XP:
+            break
+        yield from (x for x in range(start - 2, start + 3) if 0 <= x <= MAX_XP)
+
+
+@pytest.mark.parametrize("xp", list(_boundary_xp()))
+def test_get_level_matches_loop_at_level_boundaries(xp):
+    assert get_level(xp) == _reference_level(xp)
+
+
+def test_get_level_matches_loop_for_low_xp():
+    for xp in range(0, 200_001):
+        assert get_level(xp) == _reference_level(xp), xp
+
+
+def test_get_level_matches_loop_up_to_ten_million():
+    for xp in range(0, MAX_XP + 1, 997):
+        assert get_level(xp) == _reference_level(xp), xp
+    assert get_level(MAX_XP) == _reference_level(MAX_XP)
@@ -80,11 +80,13 @@ export default function Quiz() {
         if (nextLevel > 3) return;
 
         try {
-            const result = await quizzesAPI.hint(currentQuestion.id, nextLevel);
-            setHints({ ...hints, [nextLevel]: result.hint_text });
             setHintLevel(nextLevel);
+            await quizzesAPI.hintStream(currentQuestion.id, nextLevel, (text) =>
+                setHints((prev) => ({ ...prev, [nextLevel]: text }))
+            );
         } catch (err) {
             console.error(err);
+            setHintLevel(nextLevel - 1);
         }
     }
 
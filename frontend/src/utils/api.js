@@ -60,6 +60,42 @@ export const quizzesAPI = {
                 hint_level: hintLevel,
             }),
         }),
+    // Streams the hint over SSE, calling onText with the text received so far
+    hintStream: async (questionId, hintLevel, onText) => {
+        const response = await fetch(`${API_BASE}/quizzes/hint/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                question_id: questionId,
+                hint_level: hintLevel,
+            }),
+        });
+
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({ detail: 'An error occurred' }));
+            throw new Error(error.detail || `HTTP Error ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            for (const event of events) {
+                if (event.startsWith('event: done')) continue;
+                const data = event.replace(/^data: /, '');
+                text += JSON.parse(data).text;
+                onText(text);
+            }
+        }
+        return text;
+    },
     get: (quizId) => request(`/quizzes/${quizId}`),
 };
 